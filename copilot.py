@@ -1,38 +1,81 @@
-import json, asyncio
+import io, json, sys, asyncio, hashlib
 import click
 from hacks.openai_client import create_openai_copilot_client
-from main import read_file, write_file, edit_file, shell, load_mcp_config
+from main import (
+    read_file,
+    write_file,
+    edit_file,
+    shell,
+    load_mcp_config,
+    prompt_mcp_env,
+    dump_result,
+    trim_history,
+    run_async,
+)
+
+
+def prompt_cache_key(system_prompt):
+    """Stable key that routes requests sharing a system prompt to the same cache"""
+    return hashlib.blake2b(system_prompt.encode(), digest_size=8).hexdigest()
 
 
-async def loop_responses(system_prompt, toolbox, messages, user_input, model="gpt-5"):
+async def loop_responses(
+    client, system_prompt, toolbox, messages, user_input, model="gpt-5"
+):
     """Loop using OpenAI Responses API - for gpt-5 and gpt-5-codex"""
     messages.append({"role": "user", "content": user_input})
+    trim_history(messages)
 
-    while True:
-        tools = (
-            [
-                {
-                    "type": "function",
-                    "name": t["name"],
-                    "description": t["description"],
-                    "parameters": t["input_schema"],
-                }
-                for t in toolbox.schema()
-            ]
-            if toolbox.schema()
-            else None
-        )
+    tools = toolbox.responses_schema
+    cache_key = prompt_cache_key(system_prompt)
 
-        response = await client.responses.create(
+    while True:
+        stream = await client.responses.create(
             model=model,
             instructions=system_prompt,
             input=messages,
             tools=tools,
             reasoning={"effort": "high", "summary": "auto"},
             tool_choice="auto" if tools else None,
+            prompt_cache_key=cache_key,
+            stream=True,
         )
 
-        messages.extend(response.output)
+        # Start each tool as soon as its call is complete in the stream, so
+        # tool execution overlaps with the rest of the model's output.
+        # Identical calls to read-only tools within a turn share a single run.
+        function_calls, tasks, started = [], [], {}
+        response = error = None
+        async with asyncio.TaskGroup() as tg:
+            async for event in stream:
+                if (
+                    event.type == "response.output_item.done"
+                    and event.item.type == "function_call"
+                ):
+                    item = event.item
+                    function_calls.append(item)
+                    tasks.append(
+                        start_tool_call(tg, toolbox, started, item.name, item.arguments)
+                    )
+                elif event.type in ("response.completed", "response.incomplete"):
+                    response = event.response
+                elif event.type == "response.failed":
+                    error = event.response.error and event.response.error.message
+                    error = error or "response failed"
+                elif event.type == "error":
+                    # The SDK does not raise for errors sent mid-stream
+                    error = event.message
+
+        if response is None:
+            print(f"❌ {error or 'stream ended without a response'}")
+            return
+        results = [task.result() for task in tasks]
+
+        # Store output items as the plain dicts the SDK would send, so later
+        # requests replay them without dumping each Pydantic model again
+        messages.extend(
+            item.model_dump(exclude_unset=True, mode="json") for item in response.output
+        )
 
         for item in response.output:
             if item.type == "reasoning":
@@ -53,99 +96,139 @@ async def loop_responses(system_prompt, toolbox, messages, user_input, model="gp
                     if content.type == "output_text":
                         print(f"🤖 {content.text}")
 
-        function_calls = [
-            item for item in response.output if item.type == "function_call"
-        ]
-
         if not function_calls:
             break
 
-        results = await asyncio.gather(
-            *[
-                toolbox.run(item.name, json.loads(item.arguments))
-                for item in function_calls
-            ]
-        )
-
+        out = io.StringIO()
         for item, result in zip(function_calls, results):
             status = "✅" if result.get("success") else "❌"
-            print(f"{status} {item.name}:")
-            print(json.dumps(result, indent=2))
+            payload, display = dump_result(result)
+            out.write(f"{status} {item.name}:\n{display}\n")
 
             messages.append(
                 {
                     "type": "function_call_output",
                     "call_id": item.call_id,
-                    "output": json.dumps(result),
+                    "output": payload,
                 }
             )
 
+        sys.stdout.write(out.getvalue())
+        sys.stdout.flush()
+
+
+# Tools without side effects; identical calls to these within a turn share one
+# run, while every other call (shell, writes, MCP tools) runs each time
+READ_ONLY_TOOLS = {"read_file"}
+
+
+def start_tool_call(tg, toolbox, started, name, arguments):
+    """Start a tool call in the task group and return its task.
+
+    `started` maps (name, arguments) to read-only calls already started this
+    turn, so identical reads share a single run.
+    """
+    key = (name, arguments)
+    if name in READ_ONLY_TOOLS and key in started:
+        return started[key]
+    task = tg.create_task(toolbox.run(name, json.loads(arguments or "{}")))
+    if name in READ_ONLY_TOOLS:
+        started[key] = task
+    return task
+
 
 async def loop_completions(
-    system_prompt, toolbox, messages, user_input, model="claude-sonnet-4.5"
+    client, system_prompt, toolbox, messages, user_input, model="claude-sonnet-4.5"
 ):
     """Loop using OpenAI Chat Completions API - for all other models"""
+    # The system message is stored once at the head of the history so each
+    # request can send `messages` as-is instead of copying it per round-trip
+    if not messages:
+        messages.append({"role": "system", "content": system_prompt})
     messages.append({"role": "user", "content": user_input})
+    trim_history(messages)
 
-    while True:
-        tools = (
-            [
-                {
-                    "type": "function",
-                    "function": {
-                        "name": t["name"],
-                        "description": t["description"],
-                        "parameters": t["input_schema"],
-                    },
-                }
-                for t in toolbox.schema()
-            ]
-            if toolbox.schema()
-            else None
-        )
+    tools = toolbox.chat_schema
+    cache_key = prompt_cache_key(system_prompt)
 
-        response = await client.chat.completions.create(
+    while True:
+        stream = await client.chat.completions.create(
             model=model,
-            messages=[{"role": "system", "content": system_prompt}] + messages,
+            messages=messages,
             tools=tools,
             reasoning_effort="high",
             tool_choice="auto" if tools else None,
+            prompt_cache_key=cache_key,
+            stream=True,
         )
 
-        msg = response.choices[0].message
+        # Reassemble tool calls from the deltas, which are keyed by index, and
+        # start each one as soon as the next call begins (or the stream ends),
+        # since its arguments are complete by then
+        content, calls, tasks, started = [], {}, [], {}
+        async with asyncio.TaskGroup() as tg:
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta
+                if delta.content:
+                    content.append(delta.content)
+                for tc in delta.tool_calls or []:
+                    call = calls.get(tc.index)
+                    if call is None:
+                        if calls:
+                            last = calls[next(reversed(calls))]["function"]
+                            tasks.append(start_tool_call(tg, toolbox, started, **last))
+                        call = calls[tc.index] = {
+                            "id": tc.id or f"call_{tc.index}",
+                            "type": "function",
+                            "function": {"name": "", "arguments": ""},
+                        }
+                    elif tc.id:
+                        call["id"] = tc.id
+                    if tc.function:
+                        if tc.function.name:
+                            call["function"]["name"] = tc.function.name
+                        if tc.function.arguments:
+                            call["function"]["arguments"] += tc.function.arguments
+
+            if calls:
+                last = calls[next(reversed(calls))]["function"]
+                tasks.append(start_tool_call(tg, toolbox, started, **last))
+        tool_calls = list(calls.values())
+        results = [task.result() for task in tasks]
+
+        msg_content = "".join(content) or None
         messages.append(
-            {"role": "assistant", "content": msg.content, "tool_calls": msg.tool_calls}
+            {
+                "role": "assistant",
+                "content": msg_content,
+                "tool_calls": tool_calls or None,
+            }
         )
 
-        if msg.content:
-            print(f"🤖 {msg.content}")
+        if msg_content:
+            print(f"🤖 {msg_content}")
 
-        tool_calls = msg.tool_calls
         if not tool_calls:
             break
 
-        results = await asyncio.gather(
-            *[
-                toolbox.run(tc.function.name, json.loads(tc.function.arguments))
-                for tc in tool_calls
-            ]
-        )
-
+        out = io.StringIO()
         for tc, result in zip(tool_calls, results):
             status = "✅" if result.get("success") else "❌"
-            print(f"{status} {tc.function.name}:")
-            print(json.dumps(result, indent=2))
+            payload, display = dump_result(result)
+            out.write(f"{status} {tc['function']['name']}:\n{display}\n")
 
             messages.append(
                 {
                     "role": "tool",
-                    "tool_call_id": tc.id,
-                    "content": json.dumps(result),
+                    "tool_call_id": tc["id"],
+                    "content": payload,
                 }
             )
 
-
-client = create_openai_copilot_client()
+        sys.stdout.write(out.getvalue())
+        sys.stdout.flush()
 
 
 @click.command()
@@ -175,19 +258,27 @@ def main(model):
         loop_responses if model in ["gpt-5", "gpt-5-codex"] else loop_completions
     )
 
-    async def model_loop(system_prompt, toolbox, messages, user_input):
-        return await loop_func(
-            system_prompt, toolbox, messages, user_input, model=model
-        )
-
+    # Any missing MCP env values are prompted for before the event loop starts
     mcp_servers = load_mcp_config("mcp.yaml")
-    asyncio.run(
-        run_agent(
+    prompt_mcp_env(mcp_servers)
+
+    async def run():
+        # The client is created inside the agent's event loop since it shares
+        # an async connection pool with the token refresh
+        client = await create_openai_copilot_client()
+
+        async def model_loop(system_prompt, toolbox, messages, user_input):
+            return await loop_func(
+                client, system_prompt, toolbox, messages, user_input, model=model
+            )
+
+        await run_agent(
             tools=[read_file, write_file, edit_file, shell],
             mcp_servers=mcp_servers,
             loop=model_loop,
         )
-    )
+
+    run_async(run())
 
 
 if __name__ == "__main__":
@@ -1,12 +1,23 @@
 #!/usr/bin/env python3
 
+import asyncio
 import json
 import time
 from pathlib import Path
-from openai import AsyncOpenAI
+from importlib.util import find_spec
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
 import httpx
 import os
 
+# Shared by token refreshes and the OpenAI client so they reuse one
+# connection pool instead of opening a fresh TLS connection per request.
+# HTTP/2 multiplexes back-to-back turns over that connection when the
+# optional `h2` package is installed.
+_http = DefaultAsyncHttpxClient(
+    http2=find_spec("h2") is not None,
+    limits=httpx.Limits(max_keepalive_connections=16, keepalive_expiry=300),
+)
+
 
 def load_copilot_credentials():
     """Load GitHub Copilot credentials from .copilot.json"""
@@ -22,7 +33,14 @@ def load_copilot_credentials():
         return json.load(f)
 
 
-def refresh_copilot_token(creds):
+def save_copilot_credentials(creds):
+    """Save GitHub Copilot credentials to .copilot.json"""
+    creds_path = Path(__file__).parent.parent / ".copilot.json"
+    with open(creds_path, "w") as f:
+        json.dump(creds, f, indent=2)
+
+
+async def refresh_copilot_token(creds):
     """Refresh Copilot token if needed (within 10 minutes of expiration)"""
     refresh_threshold = time.time() + (10 * 60)
 
@@ -31,7 +49,7 @@ def refresh_copilot_token(creds):
 
     print("Copilot token expired or expiring soon, refreshing...")
 
-    response = httpx.get(
+    response = await _http.get(
         "https://api.github.com/copilot_internal/v2/token",
         headers={
             "Authorization": f"Bearer {creds['access_token']}",
@@ -47,15 +65,14 @@ def refresh_copilot_token(creds):
     creds["copilot_token"] = token_data["token"]
     creds["copilot_expires_at"] = token_data["expires_at"]
 
-    creds_path = Path(__file__).parent.parent / ".copilot.json"
-    with open(creds_path, "w") as f:
-        json.dump(creds, f, indent=2)
+    # File I/O runs in a thread so the refresh does not block the event loop
+    await asyncio.to_thread(save_copilot_credentials, creds)
 
     print("Copilot token refreshed")
     return creds["copilot_token"]
 
 
-def create_openai_copilot_client():
+async def create_openai_copilot_client():
     """Create OpenAI client using GitHub Copilot authentication"""
     print("Using GitHub Copilot with OpenAI SDK")
 
@@ -64,8 +81,8 @@ def create_openai_copilot_client():
     else:
         base_url = "https://api.githubcopilot.com"
 
-    creds = load_copilot_credentials()
-    copilot_token = refresh_copilot_token(creds)
+    creds = await asyncio.to_thread(load_copilot_credentials)
+    copilot_token = await refresh_copilot_token(creds)
 
     return AsyncOpenAI(
         api_key=copilot_token,
@@ -74,4 +91,5 @@ def create_openai_copilot_client():
             "User-Agent": "GithubCopilot/1.342.0",
             "Editor-Version": "vscode/1.102.0",
         },
+        http_client=_http,
     )
@@ -1,14 +1,26 @@
 from typing import Annotated, get_type_hints, get_origin, get_args
 from inspect import Parameter, signature
-from pydantic import create_model, Field
-import aiofiles
-from anthropic import AsyncAnthropic
-import json, os, asyncio, yaml
+from pydantic import create_model, validate_call, ConfigDict, Field, ValidationError
+import aiofiles.os
+from anthropic import AsyncAnthropic, DefaultAsyncHttpxClient
+import httpx
+import json, os, re, sys, shlex, signal, asyncio, threading, yaml
 from datetime import datetime
 from pathlib import Path
 from mcp import ClientSession, StdioServerParameters
 from mcp.client.stdio import stdio_client
 from getpass import getpass
+from functools import cached_property
+from importlib.util import find_spec
+from collections import OrderedDict
+from contextlib import AsyncExitStack
+from contextvars import ContextVar
+
+try:
+    # uvloop is optional; when installed it speeds up subprocess and socket I/O
+    from uvloop import run as run_async
+except ImportError:
+    from asyncio import run as run_async
 
 
 def tool(f):
@@ -36,12 +48,15 @@ def tool(f):
     }
 
     m = create_model(f"{f.__name__} Input", **model_fields)
-    m.run = lambda self: f(**self.model_dump())
 
     return {
         "name": f.__name__,
         "description": f.__doc__ or f"Tool: {f.__name__}",
-        "model": m,
+        # Validates and coerces arguments against the signature directly, which
+        # is much cheaper than building a model instance per call; unknown
+        # arguments are dropped, as Pydantic models do by default
+        "validator": validate_call(f, config=ConfigDict(extra="ignore")),
+        "input_schema": m.model_json_schema(),
         "type": "local",
     }
 
@@ -49,16 +64,27 @@ def tool(f):
 class Toolbox:
     """Manages both local and MCP tools with proper async lifecycle management"""
 
-    def __init__(self, local_tools=[], mcp_servers=[]):
-        self.local_tools = local_tools
-        self.mcp_servers = mcp_servers
+    def __init__(self, local_tools=None, mcp_servers=None):
+        self.local_tools = list(local_tools) if local_tools else []
+        self.mcp_servers = mcp_servers or {}
         self.mcp_tools = []
-        self.mcp_connections = []
+        # All tools (local + MCP), kept up to date as MCP tools are registered
+        self.all_tools = list(self.local_tools)
+        self._exit_stack = AsyncExitStack()
+        self._schema = None
+        self._tools_by_name = {t["name"]: t for t in self.local_tools}
+        # Environment for shell tool children, minus the env vars MCP servers
+        # took from os.environ; None inherits os.environ unchanged
+        self._child_env = None
 
     async def __aenter__(self):
         """Async context manager entry - connect to MCP servers"""
         if self.mcp_servers:
-            await self._connect_mcp_servers()
+            try:
+                await self._connect_mcp_servers()
+            except BaseException:
+                await self.cleanup()
+                raise
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
@@ -68,91 +94,135 @@ class Toolbox:
 
     async def _connect_mcp_servers(self):
         """Connect to all MCP servers and collect their tools"""
-        for server_name, server_config in self.mcp_servers.items():
-            # Expand cwd if it's a relative path or ~
-            cwd = server_config.get("cwd")
-            if cwd:
-                cwd = str(Path(cwd).expanduser().resolve())
-
-            for env_var in server_config.get("env", {}).keys():
-                value = server_config["env"].get(env_var)
+        # Spawning is cheap and the transports must be entered from this task,
+        # so servers are started one by one; the slow handshakes then overlap
+        sessions = {
+            server_name: await self._open_session(server_config)
+            for server_name, server_config in self.mcp_servers.items()
+        }
+        tool_lists = await asyncio.gather(
+            *(self._list_tools(session) for session in sessions.values())
+        )
+
+        mcp_tools = [
+            {
+                # Prefix tool name with mcp__SERVER_NAME__
+                "name": f"mcp__{server_name}__{tool.name}",
+                "description": tool.description or f"MCP Tool: {tool.name}",
+                "input_schema": tool.inputSchema,
+                "mcp_session": session,
+                "mcp_original_name": tool.name,  # Store original name for calling
+                "type": "mcp",
+            }
+            for (server_name, session), tools_list in zip(sessions.items(), tool_lists)
+            for tool in tools_list.tools
+        ]
+        self.mcp_tools.extend(mcp_tools)
+        self.all_tools.extend(mcp_tools)
+        self._tools_by_name.update((t["name"], t) for t in mcp_tools)
+
+        self._invalidate_schema()
+
+    async def _open_session(self, server_config):
+        """Start an MCP server and open a client session on its stdio"""
+        # Expand cwd if it's a relative path or ~
+        cwd = server_config.get("cwd")
+        if cwd:
+            cwd = str(Path(cwd).expanduser().resolve())
+
+        # Fill in the env on a copy so the loaded config is left untouched;
+        # values missing from the environment are asked for up front by
+        # prompt_mcp_env, before the event loop starts
+        env = server_config.get("env")
+        if env is not None:
+            env = dict(env)
+            for env_var, value in env.items():
                 if value is None:
-                    value = os.environ.pop(env_var, None)
+                    value = os.environ.get(env_var)
+                    self._hide_env_var(env_var)
                 if value is None:
-                    value = getpass(f"Enter value for {env_var}: ")
-                    value = value.strip()
-                server_config["env"][env_var] = value
-
-            server_params = StdioServerParameters(
-                command=server_config["command"],
-                args=server_config.get("args", []),
-                env=server_config.get("env"),
-                cwd=cwd,
-            )
-
-            # Create and enter context managers
-            stdio_ctx = stdio_client(server_params)
-            read, write = await stdio_ctx.__aenter__()
-
-            session_ctx = ClientSession(read, write)
-            session = await session_ctx.__aenter__()
-            await session.initialize()
+                    raise ValueError(f"MCP server env var {env_var} is not set")
+                env[env_var] = value
+
+        server_params = StdioServerParameters(
+            command=server_config["command"],
+            args=server_config.get("args", []),
+            env=env,
+            cwd=cwd,
+        )
 
-            # Store contexts for cleanup
-            self.mcp_connections.append(
-                {
-                    "stdio_ctx": stdio_ctx,
-                    "session_ctx": session_ctx,
-                }
-            )
+        read, write = await self._exit_stack.enter_async_context(
+            stdio_client(server_params)
+        )
+        return await self._exit_stack.enter_async_context(ClientSession(read, write))
 
-            # Get tools from this server
-            tools_list = await session.list_tools()
+    def _hide_env_var(self, env_var):
+        """Keep an env var handed to an MCP server out of shell tool children"""
+        env = os.environ if self._child_env is None else self._child_env
+        self._child_env = {k: v for k, v in env.items() if k != env_var}
 
-            for tool in tools_list.tools:
-                # Prefix tool name with mcp__SERVER_NAME__
-                prefixed_name = f"mcp__{server_name}__{tool.name}"
-                self.mcp_tools.append(
-                    {
-                        "name": prefixed_name,
-                        "description": tool.description or f"MCP Tool: {tool.name}",
-                        "input_schema": tool.inputSchema,
-                        "mcp_session": session,
-                        "mcp_original_name": tool.name,  # Store original name for calling
-                        "type": "mcp",
-                    }
-                )
+    @staticmethod
+    async def _list_tools(session):
+        """Initialize a session and fetch the tools its server offers"""
+        await session.initialize()
+        return await session.list_tools()
 
     async def cleanup(self):
         """Properly cleanup all MCP connections"""
-        for conn in reversed(self.mcp_connections):
-            try:
-                await conn["session_ctx"].__aexit__(None, None, None)
-            except Exception as e:
-                print(f"Error closing session: {e}")
-
-            try:
-                await conn["stdio_ctx"].__aexit__(None, None, None)
-            except Exception as e:
-                print(f"Error closing stdio: {e}")
+        try:
+            await self._exit_stack.aclose()
+        except Exception as e:
+            print(f"Error closing MCP connections: {e}")
 
-    @property
-    def all_tools(self):
-        """Return all tools (local + MCP)"""
-        return self.local_tools + self.mcp_tools
+    def _invalidate_schema(self):
+        """Drop cached schemas so they are rebuilt with the current tools"""
+        self._schema = None
+        self.__dict__.pop("responses_schema", None)
+        self.__dict__.pop("chat_schema", None)
 
     def schema(self):
+        """Return the Anthropic tool schema, built once per toolbox"""
+        if self._schema is None:
+            self._schema = [
+                {
+                    "name": t["name"],
+                    "description": t["description"],
+                    "input_schema": t["input_schema"],
+                }
+                for t in self.all_tools
+            ]
+        return self._schema
+
+    @cached_property
+    def responses_schema(self):
+        """Tool schema in the OpenAI Responses API shape, or None without tools"""
         return [
             {
+                "type": "function",
                 "name": t["name"],
                 "description": t["description"],
-                "input_schema": t.get("input_schema") or t["model"].model_json_schema(),
+                "parameters": t["input_schema"],
             }
-            for t in self.all_tools
-        ]
+            for t in self.schema()
+        ] or None
+
+    @cached_property
+    def chat_schema(self):
+        """Tool schema in the OpenAI Chat Completions shape, or None without tools"""
+        return [
+            {
+                "type": "function",
+                "function": {
+                    "name": t["name"],
+                    "description": t["description"],
+                    "parameters": t["input_schema"],
+                },
+            }
+            for t in self.schema()
+        ] or None
 
     async def run(self, name, input):
-        tool = next(t for t in self.all_tools if t["name"] == name)
+        tool = self._tools_by_name[name]
 
         if tool.get("type") == "mcp":
             # Use original tool name for MCP call
@@ -164,23 +234,72 @@ class Toolbox:
                     c.text for c in result.content if hasattr(c, "text")
                 ),
             }
-        else:
-            return await tool["model"](**input).run()
+
+        token = _shell_env.set(self._child_env)
+        try:
+            return await tool["validator"](**input)
+        except ValidationError as e:
+            # Report bad input back to the model rather than failing the turn
+            return {"success": False, "output": str(e)}
+        finally:
+            _shell_env.reset(token)
+
+
+FILE_CACHE_SIZE = 64
+# Larger files are read from disk every time, capping the cache at 64 MiB
+FILE_CACHE_MAX_FILE_BYTES = 1024 * 1024
+
+# filename -> (st_mtime_ns, st_size, data), least recently used first
+_file_cache = OrderedDict()
+
+
+async def _cache_file(filename, data, st=None):
+    """Remember the bytes of a file, keyed by its current mtime and size"""
+    if len(data) > FILE_CACHE_MAX_FILE_BYTES:
+        _file_cache.pop(filename, None)
+        return
+    if st is None:
+        st = await aiofiles.os.stat(filename)
+    _file_cache[filename] = (st.st_mtime_ns, st.st_size, data)
+    _file_cache.move_to_end(filename)
+    while len(_file_cache) > FILE_CACHE_SIZE:
+        _file_cache.popitem(last=False)
+
+
+async def _read_bytes(filename):
+    """Read a file, serving repeated reads of an unchanged file from memory"""
+    st = await aiofiles.os.stat(filename)
+    cached = _file_cache.get(filename)
+    if cached and cached[:2] == (st.st_mtime_ns, st.st_size):
+        _file_cache.move_to_end(filename)
+        return cached[2]
+
+    data = await asyncio.to_thread(Path(filename).read_bytes)
+    await _cache_file(filename, data, st)
+    return data
+
+
+async def _write_text(filename, content):
+    """Write a file as UTF-8 and keep the cache in step so the next read is free"""
+    data = content.encode()
+    await asyncio.to_thread(Path(filename).write_bytes, data)
+    await _cache_file(filename, data)
 
 
 @tool
 async def read_file(filename: Annotated[str, "The path to the file to read"]):
     """Read the whole file"""
-    async with aiofiles.open(filename, "r") as f:
-        return {"success": True, "filename": filename, "output": await f.read()}
+    data = await _read_bytes(filename)
+    # Translate line endings the way text-mode open() does
+    text = data.decode(errors="replace").replace("\r\n", "\n").replace("\r", "\n")
+    return {"success": True, "filename": filename, "output": text}
 
 
 @tool
 async def write_file(filename: str, content: str):
     """Write the file with the content. This is an overwrite"""
-    async with aiofiles.open(filename, "w") as f:
-        await f.write(content)
-        return {"success": True, "filename": filename, "output": f"wrote to {filename}"}
+    await _write_text(filename, content)
+    return {"success": True, "filename": filename, "output": f"wrote to {filename}"}
 
 
 @tool
@@ -190,96 +309,260 @@ async def edit_file(
     new_text: Annotated[str, "the text to replace with"],
 ):
     """Edit the file with the new text. Note that the text to replace should only appear once in the file."""
-    async with aiofiles.open(filename, "r") as f:
-        content = await f.read()
+    try:
+        content = (await _read_bytes(filename)).decode()
+    except UnicodeDecodeError:
+        # Writing back a lossy decode would corrupt the undecodable bytes
+        return {
+            "success": False,
+            "filename": filename,
+            "output": "file is not valid UTF-8 text",
+        }
 
-    if content.count(old_text) != 1:
+    # read_file shows every line ending as \n, so give the model's text the
+    # file's own line endings and splice it into the content untouched
+    if "\r\n" in content:
+        newline = "\r\n"
+    elif "\r" in content and "\n" not in content:
+        newline = "\r"
+    else:
+        newline = None
+    if newline:
+        old_text = old_text.replace("\r\n", "\n").replace("\n", newline)
+        new_text = new_text.replace("\r\n", "\n").replace("\n", newline)
+
+    # Stop scanning at the second match rather than counting every occurrence
+    start = content.find(old_text)
+    if start == -1:
+        occurrences = "0 times"
+    elif content.find(old_text, start + len(old_text)) != -1:
+        occurrences = "more than once"
+    else:
+        occurrences = None
+
+    if occurrences:
         return {
             "success": False,
             "filename": filename,
-            "output": f"old text appears {content.count(old_text)} times in the file",
+            "output": f"old text appears {occurrences} in the file",
         }
 
-    async with aiofiles.open(filename, "w") as f:
-        await f.write(content.replace(old_text, new_text))
+    end = start + len(old_text)
+    await _write_text(filename, content[:start] + new_text + content[end:])
 
     return {"success": True, "filename": filename, "output": f"edited {filename}"}
 
 
+SHELL_OUTPUT_LIMIT = 256 * 1024
+
+# Environment for the shell tool's children, set by Toolbox.run for the
+# duration of each local tool call; None inherits os.environ
+_shell_env = ContextVar("_shell_env", default=None)
+
+# Characters that need /bin/sh to interpret; commands without any of them are
+# exec'd directly, saving a shell fork and exec per call
+_SHELL_META = re.compile(r"[|&;<>()$`\\\"'*?~#\[\]{}\n]")
+
+
+def _kill_group(p):
+    """Kill a shell started in its own session along with everything it spawned"""
+    try:
+        os.killpg(p.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+async def _reap(p, grace=1):
+    """Kill a process group and reap the shell, bounded by `grace` seconds"""
+    _kill_group(p)
+    # A child that left the group can hold the pipe open indefinitely, and
+    # wait() also waits for the pipes to close, so close our end instead of
+    # draining it. Process has no public way to do that; the transport
+    # behind it (asyncio's or uvloop's) exposes its pipes via the public
+    # SubprocessTransport.get_pipe_transport
+    if pipe := p._transport.get_pipe_transport(1):
+        pipe.close()
+    try:
+        await asyncio.wait_for(p.wait(), grace)
+    except asyncio.TimeoutError:
+        pass
+
+
+async def _spawn(command):
+    """Start a command in its own session, only going through /bin/sh if needed"""
+    kwargs = dict(
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.STDOUT,
+        start_new_session=True,
+        env=_shell_env.get(),
+    )
+    if not _SHELL_META.search(command) and (argv := shlex.split(command)):
+        try:
+            return await asyncio.create_subprocess_exec(*argv, **kwargs)
+        except OSError:
+            # Not an executable on PATH, e.g. a builtin or `VAR=value cmd`
+            pass
+    return await asyncio.create_subprocess_shell(command, **kwargs)
+
+
+async def _read_output(p, limit):
+    """Collect a process's output, killing it once `limit` bytes have arrived"""
+    output = bytearray()
+    while chunk := await p.stdout.read(64 * 1024):
+        output += chunk
+        if len(output) >= limit:
+            await _reap(p)
+            return output
+    await p.wait()
+    return output
+
+
 @tool
 async def shell(
     command: Annotated[str, "command to execute"],
     timeout: Annotated[int, "timeout in seconds"] = 30,
 ):
     """Execute a bash command"""
+    p = await _spawn(command)
     try:
-        p = await asyncio.create_subprocess_shell(
-            command, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT
-        )
-        stdout, _ = await asyncio.wait_for(p.communicate(), timeout)
-        return {
-            "success": p.returncode == 0,
-            "command": command,
-            "output": stdout.decode(),
-        }
+        output = await asyncio.wait_for(_read_output(p, SHELL_OUTPUT_LIMIT), timeout)
     except asyncio.TimeoutError:
+        await _reap(p)
         return {"success": False, "command": command, "output": "Timeout"}
+    except asyncio.CancelledError:
+        # The shell is in its own session, so Ctrl-C no longer reaches it
+        _kill_group(p)
+        raise
+
+    result = {
+        "success": p.returncode == 0,
+        "command": command,
+        "output": output[:SHELL_OUTPUT_LIMIT].decode(errors="replace"),
+    }
+    if len(output) >= SHELL_OUTPUT_LIMIT:
+        result["truncated"] = True
+    return result
+
+
+def dump_result(result):
+    """Serialize a tool result once, returning (payload, display).
+
+    The pretty-printed form is only produced for interactive terminals;
+    otherwise the payload sent to the model is reused for display.
+    """
+    payload = json.dumps(result)
+    display = json.dumps(result, indent=2) if sys.stdout.isatty() else payload
+    return payload, display
+
+
+MAX_TURNS = 20
+MAX_HISTORY_TOKENS = 60_000
+
+
+def estimate_tokens(message):
+    """Roughly estimate a message's size in tokens (~4 characters each)"""
+    return len(str(message)) // 4
+
+
+def trim_history(messages, max_turns=MAX_TURNS, max_tokens=MAX_HISTORY_TOKENS):
+    """Drop the oldest turns in place once the history exceeds either limit.
+
+    A turn starts at a plain-text user message, so tool calls stay paired with
+    their results. A leading system message is kept, and so is the turn before
+    the newest one, so the agent always remembers what it just did.
+    """
+    head = 1 if messages and messages[0].get("role") == "system" else 0
+    starts = [
+        i
+        for i in range(head, len(messages))
+        if messages[i].get("role") == "user"
+        and isinstance(messages[i].get("content"), str)
+    ]
+    if len(starts) < 2:
+        return
+
+    sizes = [estimate_tokens(m) for m in messages]
+    total = sum(sizes[head:])
+    end = head
+    for j, start in enumerate(starts[:-1]):
+        total -= sum(sizes[end:start])
+        end = start
+        if len(starts) - j <= max_turns and total <= max_tokens:
+            break
+    del messages[head:end]
 
 
 async def loop(system_prompt, toolbox, messages, user_input):
     messages.append({"role": "user", "content": user_input})
+    trim_history(messages)
 
-    while True:
-        msg = await client.messages.create(
-            max_tokens=2048,
-            thinking={"type": "enabled", "budget_tokens": 1024},
-            system=[{"type": "text", "text": system_prompt}],
-            messages=messages,
-            model="claude-sonnet-4-5",
-            tools=toolbox.schema(),
-        )
-
-        messages.append({"role": "assistant", "content": msg.content})
-
-        thinking_text = " ".join(
-            t.thinking for t in msg.content if t.type == "thinking"
-        )
-        if thinking_text:
-            print(f"💭 {thinking_text}")
+    tools_schema = toolbox.schema()
+    system = [{"type": "text", "text": system_prompt}]
 
-        agent_text = " ".join(t.text for t in msg.content if t.type == "text")
-        if agent_text:
-            print(f"🤖 {agent_text}")
+    while True:
+        tasks, results = {}, {}
+        async with asyncio.TaskGroup() as tg:
+            async with client.messages.stream(
+                max_tokens=2048,
+                thinking={"type": "enabled", "budget_tokens": 1024},
+                system=system,
+                messages=messages,
+                model="claude-sonnet-4-5",
+                tools=tools_schema,
+            ) as stream:
+                # Print thinking and text as they arrive, and start each tool
+                # as soon as its tool_use block is complete
+                async for event in stream:
+                    if event.type == "content_block_start":
+                        if event.content_block.type == "thinking":
+                            print("💭 ", end="", flush=True)
+                        elif event.content_block.type == "text":
+                            print("🤖 ", end="", flush=True)
+                    elif event.type == "thinking":
+                        print(event.thinking, end="", flush=True)
+                    elif event.type == "text":
+                        print(event.text, end="", flush=True)
+                    elif event.type == "content_block_stop":
+                        block = event.content_block
+                        if block.type in ("thinking", "text"):
+                            print()
+                        elif block.type == "tool_use":
+                            task = tg.create_task(toolbox.run(block.name, block.input))
+                            tasks[task] = block
+                msg = await stream.get_final_message()
+
+            messages.append({"role": "assistant", "content": msg.content})
+
+            # Display each tool result as soon as it finishes
+            async for task in asyncio.as_completed(tasks):
+                r = task.result()
+                payload, display = dump_result(r)
+                results[task] = {
+                    "type": "tool_result",
+                    "tool_use_id": tasks[task].id,
+                    "content": payload,
+                }
+                status = "✅" if r.get("success") else "❌"
+                sys.stdout.write(f"{status} {tasks[task].name}:\n{display}\n")
+                sys.stdout.flush()
 
-        tools = [t for t in msg.content if t.type == "tool_use"]
-        if not tools:
+        if not tasks:
             break
 
-        # Execute all tools and collect results
-        results = await asyncio.gather(*[toolbox.run(t.name, t.input) for t in tools])
+        # Send results back to the model in the order the tools were called
+        messages.append({"role": "user", "content": [results[t] for t in tasks]})
 
-        # Display results and send back to model
-        for t, r in zip(tools, results):
-            status = "✅" if r.get("success") else "❌"
-            print(f"{status} {t.name}:")
-            print(json.dumps(r, indent=2))
 
-        messages.append(
-            {
-                "role": "user",
-                "content": [
-                    {
-                        "type": "tool_result",
-                        "tool_use_id": t.id,
-                        "content": json.dumps(r),
-                    }
-                    for t, r in zip(tools, results)
-                ],
-            }
-        )
-
-
-client = AsyncAnthropic()
+# Keep connections to the API warm between turns. DefaultAsyncHttpxClient
+# keeps the SDK's timeouts; HTTP/2 is used only when `h2` is installed
+client = AsyncAnthropic(
+    http_client=DefaultAsyncHttpxClient(
+        http2=find_spec("h2") is not None,
+        limits=httpx.Limits(
+            max_connections=32, max_keepalive_connections=16, keepalive_expiry=300
+        ),
+    )
+)
 
 
 def load_mcp_config(config_path="mcp.yaml"):
@@ -291,7 +574,8 @@ def load_mcp_config(config_path="mcp.yaml"):
 
     try:
         with open(config_file, "r") as f:
-            config = yaml.safe_load(f)
+            # Use libyaml's C loader when PyYAML was built with it
+            config = yaml.load(f, Loader=getattr(yaml, "CSafeLoader", yaml.SafeLoader))
             if config is None:
                 return {}
             return config.get("servers", {})
@@ -300,7 +584,45 @@ def load_mcp_config(config_path="mcp.yaml"):
         return {}
 
 
-async def run_agent(tools=[], mcp_servers=[], loop=loop):
+def prompt_mcp_env(mcp_servers):
+    """Ask for MCP server env values that are neither configured nor set.
+
+    This runs before the event loop starts, so getpass can restore the
+    terminal when interrupted; answers are kept in os.environ for the servers.
+    """
+    for server_config in mcp_servers.values():
+        for env_var, value in (server_config.get("env") or {}).items():
+            if value is None and env_var not in os.environ:
+                value = getpass(f"Enter value for {env_var}: ")
+                os.environ[env_var] = value.strip()
+
+
+async def ainput(prompt=""):
+    """Read a line from stdin without blocking the event loop.
+
+    The read runs on a daemon thread rather than `asyncio.to_thread`, so a
+    prompt abandoned on Ctrl-C does not hold up interpreter shutdown.
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def settle(method, value):
+        if not future.done():
+            method(value)
+
+    def read():
+        try:
+            line = input(prompt)
+        except BaseException as e:
+            loop.call_soon_threadsafe(settle, future.set_exception, e)
+        else:
+            loop.call_soon_threadsafe(settle, future.set_result, line)
+
+    threading.Thread(target=read, daemon=True).start()
+    return await future
+
+
+async def run_agent(tools=None, mcp_servers=None, loop=loop):
     """Run the agent with local tools and optional MCP servers"""
     async with Toolbox(local_tools=tools, mcp_servers=mcp_servers) as toolbox:
         messages = []
@@ -321,20 +643,22 @@ You are running on {str(os.uname())}, today is {datetime.now().strftime("%Y-%m-%
 
         try:
             while True:
-                user_input = input("> ")
+                user_input = await ainput("> ")
                 if user_input.lower() == "exit":
                     print("👋 Goodbye!")
                     break
                 await loop(system_prompt, toolbox, messages, user_input)
-        except (KeyboardInterrupt, EOFError):
+        except (KeyboardInterrupt, EOFError, asyncio.CancelledError):
+            # asyncio.run turns Ctrl-C into cancellation of the main task
             print("👋 Goodbye!")
 
 
 if __name__ == "__main__":
     # Load MCP servers from mcp.yaml if it exists, otherwise use default config
     mcp_servers = load_mcp_config("mcp.yaml")
+    prompt_mcp_env(mcp_servers)
 
-    asyncio.run(
+    run_async(
         run_agent(
             tools=[read_file, write_file, edit_file, shell], mcp_servers=mcp_servers
         )